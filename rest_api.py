@@ -1,14 +1,24 @@
-import shutil
-from src.llm_client.gemini_llm import get_answer, get_google_llm, get_prompt_template
-from src.database.mongo_utils import create_vector_index, search_result_for_llm, upsert_data
-from src.data_processing.pdf_processor import DocumentProcessor
+import asyncio
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import aiofiles
+from src.llm_client.gemini_llm import get_answer, get_chain, get_google_llm, get_prompt_template
+from src.database.mongo_utils import (create_vector_index, get_cached_embeddings, save_cached_embeddings,
+                                      search_result_for_llm_with_vec, upsert_data)
+from src.data_processing.pdf_processor import DocumentProcessor, warm_up_converter
 from src.chunking.data_chunking import DocumentChunking
+from src.cache.exact_cache import ExactCache
+from src.cache.semantic_cache import SemanticCache
+from src.cache.cache_warmup import read_logged_answers
 from pathlib import Path
 from src.llm_client.google_embedder import get_google_embeddings
 from utils import setup_logging
-from fastapi import FastAPI, UploadFile, HTTPException
+from fastapi import BackgroundTasks, FastAPI, UploadFile, HTTPException
 import os
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+from typing import Optional
 import logging
 
 # Initialize logger
@@ -25,17 +35,224 @@ setup_logging(output_folder=output_folder)
 # Initialize Google embeddings client (used for vector search)
 embeddings=get_google_embeddings()
 
+# Initialize Gemini model, prompt template and RAG chain once (reused per query)
+LLM=get_google_llm()
+PROMPT=get_prompt_template(prompt_path=prompt_path)
+CHAIN=get_chain(llm=LLM, prompt=PROMPT)
+
+# Exact-match cache of answers for repeated queries
+exact_cache=ExactCache(maxsize=2048, ttl=3600)
+
+# Semantic cache of answers for near-duplicate queries
+semantic_cache=SemanticCache(dim=768, threshold=0.95, maxsize=1024, ttl=3600)
+semantic_cache_path=output_folder / "semantic_cache.pkl"
+warmup_lock_path=output_folder / "semantic_cache.warmup.lock"
+CACHE_WARMUP_QUERIES=100  # Most frequent logged queries used to warm the caches
+
+# Touched after every successful upload so that all server workers drop their cached answers
+cache_epoch_path=output_folder / "cache_epoch"
+
+# Process pool for CPU-heavy Docling conversion, kept off the event loop.
+# "spawn" avoids forking the server process with its open Mongo/gRPC clients.
+# Each uvicorn worker has its own pool, so CPUs are shared between workers by default.
+WEB_CONCURRENCY=int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+DOCLING_WORKERS=int(os.getenv("DOCLING_WORKERS") or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))
+EXECUTOR=ProcessPoolExecutor(max_workers=DOCLING_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=setup_logging, initargs=(output_folder,))
+
+# Save intermediate header splits to output/doc_header_splits (debugging only)
+SAVE_HEADER_SPLITS=os.getenv("SAVE_HEADER_SPLITS", "false").lower() in ("1", "true", "yes")
+
+# Size of each read when streaming uploads to disk (1 MiB)
+UPLOAD_CHUNK_SIZE=1 << 20
+
+# Embedding batch configuration
+EMBED_BATCH_SIZE=32      # Chunks sent to Gemini per embed_documents call
+EMBED_MAX_INFLIGHT=5     # Max concurrent embedding requests
+EMBED_MAX_RETRIES=3      # Retries per batch before failing the upload
+
+def _cache_epoch_mtime():
+    try:
+        return os.stat(cache_epoch_path).st_mtime
+    except FileNotFoundError:
+        return None
+
+# Epoch this worker's caches were last synced with
+_cache_epoch=_cache_epoch_mtime()
+
+def _invalidate_answer_caches():
+    '''Drop cached answers so that newly ingested documents are used.'''
+    global _cache_epoch
+    exact_cache.clear()
+    semantic_cache.clear()
+    cache_epoch_path.touch()
+    _cache_epoch=_cache_epoch_mtime()
+
+def _sync_answer_caches():
+    '''Drop cached answers if another worker ingested documents since the last check.'''
+    global _cache_epoch
+    epoch=_cache_epoch_mtime()
+    if epoch != _cache_epoch:
+        exact_cache.clear()
+        semantic_cache.clear()
+        _cache_epoch=epoch
+
+async def _embed_batches(docs, batch=EMBED_BATCH_SIZE, max_inflight=EMBED_MAX_INFLIGHT):
+    '''
+    Embed documents in fixed-size batches dispatched concurrently.
+
+    The blocking embeddings client runs in the default thread pool, so
+    network latency of the batches overlaps. Output order matches input order.
+    '''
+    loop=asyncio.get_running_loop()
+    semaphore=asyncio.Semaphore(max_inflight)
+    results=[None] * len(docs)
+
+    async def embed_slice(start):
+        texts=docs[start:start + batch]
+        async with semaphore:
+            for attempt in range(EMBED_MAX_RETRIES + 1):
+                try:
+                    vectors=await loop.run_in_executor(None, embeddings.embed_documents, texts)
+                    break
+                except Exception as e:
+                    if attempt == EMBED_MAX_RETRIES:
+                        raise
+                    # Exponential backoff: 1s, 2s, 4s, ...
+                    delay=2 ** attempt
+                    logger.warning(f"Embedding batch at {start} failed ({e}), retrying in {delay}s")
+                    await asyncio.sleep(delay)
+        results[start:start + len(vectors)]=vectors
+
+    await asyncio.gather(*[embed_slice(start) for start in range(0, len(docs), batch)])
+    return results
+
+async def _embed_with_cache(docs):
+    '''
+    Embed documents, reusing embeddings cached in MongoDB by model and content hash.
+
+    Only unique cache misses are sent to Gemini; new embeddings are written back.
+    '''
+    # Keyed on the model too, so switching embedding models never reuses stale vectors
+    hashes=[hashlib.sha256(f"{embeddings.model}\0{doc}".encode('utf-8')).hexdigest() for doc in docs]
+    # Identical chunks (e.g. repeated headers/footers) are embedded once
+    unique={}
+    for h, doc in zip(hashes, docs):
+        unique.setdefault(h, doc)
+    cached=get_cached_embeddings(list(unique))
+    missing=[h for h in unique if h not in cached]
+    logger.info(f"Embedding cache: {len(docs)} chunks, {len(unique)} unique, "
+                f"{len(unique) - len(missing)} hits, {len(missing)} misses")
+
+    if missing:
+        new_vectors=await _embed_batches([unique[h] for h in missing])
+        new_entries=dict(zip(missing, new_vectors))
+        save_cached_embeddings(new_entries)
+        cached.update(new_entries)
+
+    # Fan vectors back out to every chunk position in the original order
+    return [cached[h] for h in hashes]
+
 # Create FastAPI application
 app = FastAPI(title="Task Rest APIs",
               description="APIS for the Task",)
 
 
+def _save_header_splits(chunker, md_path, filename):
+    '''Build header-level splits and save them for debugging.'''
+    doc_header_splits=chunker.doc_header_split(md_path=md_path)
+    chunker.save_splits_jsonl(documents=doc_header_splits, filename=filename,
+                              folder_path=chunker.header_splits_folder)
+
+def _acquire_warmup_lock():
+    '''Return True for the one worker that should re-embed logged queries.'''
+    try:
+        # A lock left by a crashed worker is ignored after 10 minutes
+        if time.time() - os.stat(warmup_lock_path).st_mtime > 600:
+            os.unlink(warmup_lock_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(warmup_lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+def _warmup_cutoff():
+    '''Return the time of the last upload; answers logged before it are outdated.'''
+    # Re-read on every use, since an upload may finish while warmup is running
+    _sync_answer_caches()
+    return _cache_epoch or 0
+
+async def _warm_caches():
+    '''
+    Warm the answer caches from previously logged answers.
+
+    Only answers that are still within the cache TTL and newer than the last
+    upload are used. The semantic cache is restored from disk when available;
+    otherwise a single worker re-embeds the most frequent logged queries and
+    saves the result for the other workers and later restarts.
+    '''
+    try:
+        since=max(time.time() - semantic_cache.ttl, _cache_epoch or 0)
+        logged=await asyncio.to_thread(read_logged_answers, output_folder / "app.log",
+                                       CACHE_WARMUP_QUERIES, since)
+        cutoff=_warmup_cutoff()
+        for query, answer, logged_at, source in logged:
+            if logged_at >= cutoff:
+                exact_cache.put(query, answer, created_at=logged_at, scope=source)
+
+        # Only file I/O runs off-thread; the cache itself is only touched on the event loop
+        saved_state=await asyncio.to_thread(SemanticCache.read_state, semantic_cache_path)
+        if semantic_cache.restore(saved_state, max(since, _warmup_cutoff())) or not logged:
+            return
+        if not _acquire_warmup_lock():
+            return
+        try:
+            semaphore=asyncio.Semaphore(EMBED_MAX_INFLIGHT)
+
+            async def warm(query, answer, logged_at, source):
+                async with semaphore:
+                    query_emb=await asyncio.to_thread(embeddings.embed_query, query)
+                if logged_at >= _warmup_cutoff():
+                    semantic_cache.put(query_emb, answer, created_at=logged_at, scope=source)
+
+            await asyncio.gather(*[warm(*entry) for entry in logged])
+            await asyncio.to_thread(SemanticCache.write_state, semantic_cache_path, semantic_cache.state())
+            logger.info(f"Warmed semantic cache with {len(logged)} logged queries")
+        finally:
+            os.unlink(warmup_lock_path)
+    except Exception as e:
+        logger.warning(f"Cache warmup failed: {str(e)}")
+
+@app.on_event("startup")
+async def startup_warm_caches():
+    # Run in the background so the server accepts requests immediately
+    app.state.cache_warmup=asyncio.create_task(_warm_caches())
+
+@app.on_event("startup")
+def startup_warm_executor():
+    # Start the Docling processes and load their models before the first upload
+    for _ in range(DOCLING_WORKERS):
+        EXECUTOR.submit(warm_up_converter)
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+@app.on_event("shutdown")
+def shutdown_save_semantic_cache():
+    try:
+        semantic_cache.save(semantic_cache_path)
+    except Exception as e:
+        logger.warning(f"Could not save semantic cache: {str(e)}")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Task Rest APIs! Visit /docs to view the interactive API documentation"}
 
 @app.post("/upload")
-async def upload_file(file: UploadFile):
+async def upload_file(file: UploadFile, background_tasks: BackgroundTasks):
     '''
     Upload and process PDF files
 
@@ -57,42 +274,47 @@ async def upload_file(file: UploadFile):
 
         # Save uploaded file to data directory
         file_path=os.path.join(pdf_folder, file.filename)
-        with open(file_path, 'wb') as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Stream the upload to disk in chunks without blocking the event loop
+        async with aiofiles.open(file_path, 'wb') as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
         
         pdf_stem = Path(file_path).stem 
         
-        # Step 1: Convert PDF to markdown using Docling
+        # Step 1: Convert PDF to markdown using Docling (in the process pool)
         processor=DocumentProcessor(output_folder=output_folder)
-        md_path=processor.convert_to_markdown(pdf_path=file_path)
+        loop=asyncio.get_running_loop()
+        md_path=await loop.run_in_executor(EXECUTOR, processor.convert_to_markdown, file_path)
 
         # Step 2: Intelligent document chunking
-        # First split by headers, then by character chunks for optimal retrieval 
+        # Split by headers and by character chunks in a single pass for optimal retrieval 
         chunker=DocumentChunking(output_folder=output_folder)
-        doc_header_splits=chunker.doc_header_split(md_path=md_path)
-        doc_char_splits=chunker.doc_chunk_splits(header_splits=doc_header_splits)
+        doc_char_splits=await asyncio.to_thread(chunker.doc_chunk_splits, md_path=md_path)
         
 
         # Step 3: Saving these splits in the output folder for future use (if any)
+        # Not needed to answer queries, so written after the response is sent
         header_filename = f"{pdf_stem}_header_splits.jsonl"
         char_filename = f"{pdf_stem}_char_splits.jsonl"
 
-        header_splits_path=chunker.save_splits_jsonl(documents=doc_header_splits,
-                            filename=header_filename, folder_path=chunker.header_splits_folder)
-        char_splits_path=chunker.save_splits_jsonl(documents=doc_char_splits, 
-                            filename=char_filename, folder_path=chunker.char_splits_folder)
+        # Header-level splits are only needed for debugging
+        if SAVE_HEADER_SPLITS:
+            background_tasks.add_task(_save_header_splits, chunker=chunker, md_path=md_path,
+                                      filename=header_filename)
+        background_tasks.add_task(chunker.save_splits_jsonl, documents=doc_char_splits,
+                                  filename=char_filename, folder_path=chunker.char_splits_folder)
         
         # Step 4: Generate embeddings for vector search
         # Extract text from the splits for embedding
         docs = [split.page_content for split in doc_char_splits]
-        vectors = embeddings.embed_documents(
-            docs
-        )
+        vectors = await _embed_with_cache(docs)
         logger.info(f"Generated {len(vectors)} embeddings with dimension {len(vectors[0])}")
         
         # Step 5: Store in MongoDB with vector search capabilities
         create_vector_index() # Ensure vector search index exists
         upsert_data(chunks=doc_char_splits, vectors=vectors, pdf_path=Path(file_path))
+        # Cached answers may be outdated now that new content is searchable
+        _invalidate_answer_caches()
         return {
                 "message": "File processed successfully",
                 "filename": file.filename,
@@ -106,28 +328,49 @@ async def upload_file(file: UploadFile):
 class QueryRequest(BaseModel):
     """Request model for user queries"""
     query: str
+    # Optional PDF filename to restrict the search to
+    source: Optional[str] = None
+
+    @field_validator('source')
+    @classmethod
+    def blank_source_to_none(cls, value):
+        """Treat an empty or whitespace-only source as no filter"""
+        if value is not None and not value.strip():
+            return None
+        return value
 
 @app.post('/user_query')
 async def ask_llm(request: QueryRequest):
     '''
     Pipeline:
-    1. Convert user query to embedding vector
-    2. Search MongoDB for relevant document chunks
-    3. Use retrieved context with Gemini AI to generate answer
-    4. Return answer with source citations
+    1. Return cached answer if the identical query was answered before
+    2. Convert user query to embedding vector
+    3. Return cached answer if a near-identical query was answered before
+    4. Search MongoDB for relevant document chunks
+    5. Use retrieved context with Gemini AI to generate answer
+    6. Return answer with source citations
     '''
     try:
-        # Step 1: Retrieve relevant context using vector search
-        context=search_result_for_llm(query=request.query, top_k=3, embeddings=embeddings)
-        
-        # Step 2: Initialize Gemini AI model
-        llm=get_google_llm()
-        
-        # Step 3: Load prompt template for structured responses
-        prompt=get_prompt_template(prompt_path=prompt_path)
+        _sync_answer_caches()
+        # Step 1: Check the exact-match cache (skips the embedding call)
+        cached=exact_cache.get(request.query, scope=request.source)
+        if cached is not None:
+            return {'answer': cached}
+
+        # Step 2: Embed the query once and check the semantic cache
+        query_emb=embeddings.embed_query(request.query)
+        cached=semantic_cache.get(query_emb, scope=request.source)
+        if cached is not None:
+            exact_cache.put(request.query, cached, scope=request.source)
+            return {'answer': cached}
+
+        # Step 3: Retrieve relevant context using vector search (optionally within one PDF)
+        context=search_result_for_llm_with_vec(query_emb=query_emb, top_k=3, filter_source=request.source)
         
         # Step 4: Generate answer using retrieved context
-        response=get_answer(query=request.query, llm=llm, prompt=prompt, content=context)
+        response=get_answer(query=request.query, chain=CHAIN, content=context, source=request.source)
+        exact_cache.put(request.query, response, scope=request.source)
+        semantic_cache.put(query_emb, response, scope=request.source)
         
         return {'answer': response}
     except Exception as e:
@@ -1,5 +1,16 @@
+import os
+import sys
 import uvicorn
-from rest_api import app
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
 
 if __name__=="__main__":
-    uvicorn.run("rest_api:app", host='127.0.0.1', port=8000, reload=True, reload_dirs=["src"])
\ No newline at end of file
+    # Production settings: several worker processes, no auto-reload
+    # (set WEB_CONCURRENCY to control the number of workers)
+    workers=int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+    # uvloop event loop and httptools parser (uvloop is not available on Windows)
+    loop="asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run("rest_api:app", host='0.0.0.0', port=8000, reload=False, workers=workers,
+                loop=loop, http="httptools")
@@ -0,0 +1,64 @@
+from collections import Counter
+from pathlib import Path
+import logging
+import re
+import time
+
+# Initialize logger for this module
+logger=logging.getLogger(__name__)
+
+# Start of any record written by utils.setup_logging
+_RECORD_RE=re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - ')
+# Answer record written by gemini_llm.get_answer
+_ANSWER_RE=re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) - INFO - '
+                      r'The response for the query: (.*?)(?: \[source: (.*)\])? is:\s*$')
+
+def _log_time(asctime, msecs):
+    # logging's asctime is in local time
+    return time.mktime(time.strptime(asctime, "%Y-%m-%d %H:%M:%S")) + int(msecs) / 1000
+
+def read_logged_answers(log_file, top_n=100, since=None):
+    '''
+    Extract previously answered queries from the application log.
+
+    Returns up to top_n (query, answer, logged_at, source) tuples, most
+    frequently asked first, using the latest logged answer for each query and
+    source filter. Answers logged before `since` (epoch seconds) are ignored.
+    '''
+    log_file=Path(log_file)
+    if not log_file.exists():
+        return []
+
+    counts=Counter()
+    answers={}
+    key, logged_at, answer_lines=None, None, []
+
+    def finish():
+        # The answer is logged as "\n\n {response}" after the header line
+        answer="\n".join(answer_lines)
+        answer=answer[2:] if answer.startswith("\n ") else answer.strip()
+        if answer.strip() and (since is None or logged_at >= since):
+            counts[key]+=1
+            answers[key]=(answer.rstrip(), logged_at)
+
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line=line.rstrip("\n")
+            if _RECORD_RE.match(line):
+                if key is not None:
+                    finish()
+                match=_ANSWER_RE.match(line)
+                if match:
+                    # (query, source filter)
+                    key=(match.group(3), match.group(4))
+                    logged_at, answer_lines=_log_time(match.group(1), match.group(2)), []
+                else:
+                    key=None
+            elif key is not None:
+                answer_lines.append(line)
+    if key is not None:
+        finish()
+
+    logged=[(query, *answers[(query, source)], source) for (query, source), _ in counts.most_common(top_n)]
+    logger.info(f"Loaded {len(logged)} logged answers from {log_file}")
+    return logged
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+import hashlib
+import logging
+import time
+
+# Initialize logger for this module
+logger=logging.getLogger(__name__)
+
+class ExactCache:
+    '''
+    Exact-match cache for LLM answers keyed by the SHA-256 of the normalized query.
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `maxsize` is reached.
+    '''
+    def __init__(self, maxsize=2048, ttl=3600):
+        self.maxsize=maxsize
+        self.ttl=ttl
+        # key -> (answer, insertion time), ordered by recency
+        self.entries=OrderedDict()
+        self.logger=logger
+
+    @staticmethod
+    def make_key(query, scope=None):
+        '''Hash the lowercased, stripped query together with its search scope (source filter).'''
+        # Mark scoped keys so an unscoped query never shares a key with a source, even ""
+        prefix="" if scope is None else f"\1{scope}"
+        return hashlib.sha256(f"{prefix}\0{query.strip().lower()}".encode('utf-8')).digest()
+
+    def get(self, query, scope=None):
+        '''Return the cached answer for an identical query in the same scope, or None on a miss.'''
+        key=self.make_key(query, scope)
+        entry=self.entries.get(key)
+        if entry is None:
+            return None
+        answer, created_at=entry
+        if time.time() - created_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        self.logger.info("cache hit exact")
+        return answer
+
+    def put(self, query, answer, created_at=None, scope=None):
+        '''
+        Store an answer for the query in the given scope.
+        created_at defaults to now; pass the original time when replaying old answers.
+        '''
+        key=self.make_key(query, scope)
+        self.entries[key]=(answer, time.time() if created_at is None else created_at)
+        self.entries.move_to_end(key)
+        # Evict least recently used entries
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        '''Drop all cached answers (e.g. after new documents are ingested).'''
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from itertools import combinations
+import logging
+import os
+import pickle
+import time
+import numpy as np
+
+# Initialize logger for this module
+logger=logging.getLogger(__name__)
+
+class SemanticCache:
+    '''
+    Semantic cache for LLM answers keyed by the query embedding.
+
+    Query vectors are hashed with random-projection LSH into k-bit signatures.
+    A lookup probes every signature within `max_hamming` bit flips and accepts
+    a hit only if the true cosine similarity reaches `threshold`.
+    Each signature bucket holds up to `bucket_size` entries. Entries expire
+    after `ttl` seconds and the least recently used entry is evicted once
+    `maxsize` is reached.
+    '''
+    def __init__(self, dim=768, num_planes=16, threshold=0.95, max_hamming=2,
+                 maxsize=1024, ttl=3600, bucket_size=8, seed=None):
+        self.threshold=threshold
+        self.max_hamming=max_hamming
+        self.maxsize=maxsize
+        self.ttl=ttl
+        self.bucket_size=bucket_size
+        # Random hyperplanes used for the LSH signature
+        self.planes=np.random.default_rng(seed).standard_normal((num_planes, dim))
+        # entry id -> (answer, unit vector, insertion time, signature, scope), ordered by recency
+        self.entries=OrderedDict()
+        # signature -> ids of the entries in that bucket (oldest first)
+        self.signatures={}
+        self._next_id=0
+        self.logger=logger
+
+    @staticmethod
+    def _normalize(vector):
+        vec=np.asarray(vector, dtype=np.float32)
+        norm=np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _bits(self, vec):
+        return self.planes @ vec > 0
+
+    def _neighbours(self, bits):
+        '''Yield signatures within max_hamming bit flips of bits (including bits itself).'''
+        for distance in range(self.max_hamming + 1):
+            for positions in combinations(range(len(bits)), distance):
+                flipped=bits.copy()
+                flipped[list(positions)]^=True
+                yield flipped.tobytes()
+
+    def _remove(self, entry_id):
+        sig=self.entries.pop(entry_id)[3]
+        bucket=self.signatures[sig]
+        bucket.remove(entry_id)
+        if not bucket:
+            del self.signatures[sig]
+
+    def get(self, vector, scope=None):
+        '''Return the cached answer for a similar query in the same scope (source filter), or None on a miss.'''
+        vec=self._normalize(vector)
+        now=time.time()
+        best_id, best_score=None, self.threshold
+        for sig in self._neighbours(self._bits(vec)):
+            for entry_id in list(self.signatures.get(sig, ())):
+                _, cached_vec, created_at, _, cached_scope=self.entries[entry_id]
+                if now - created_at > self.ttl:
+                    # Drop expired entries lazily
+                    self._remove(entry_id)
+                    continue
+                if cached_scope != scope:
+                    continue
+                score=float(np.dot(vec, cached_vec))
+                if score >= best_score:
+                    best_id, best_score=entry_id, score
+        if best_id is None:
+            return None
+        self.entries.move_to_end(best_id)
+        self.logger.info(f"Semantic cache hit (cosine={best_score:.3f})")
+        return self.entries[best_id][0]
+
+    def put(self, vector, answer, created_at=None, scope=None):
+        '''
+        Store an answer in the bucket of its query vector's signature, tagged with its scope.
+        created_at defaults to now; pass the original time when replaying old answers.
+        '''
+        vec=self._normalize(vector)
+        sig=self._bits(vec).tobytes()
+        # Replace the answer of the same query instead of storing it twice
+        for entry_id in list(self.signatures.get(sig, ())):
+            _, cached_vec, _, _, cached_scope=self.entries[entry_id]
+            if cached_scope == scope and float(np.dot(vec, cached_vec)) >= 0.9999:
+                self._remove(entry_id)
+        self._insert(answer, vec, time.time() if created_at is None else created_at, sig, scope)
+
+    def _insert(self, answer, vec, created_at, sig, scope):
+        entry_id=self._next_id
+        self._next_id+=1
+        self.entries[entry_id]=(answer, vec, created_at, sig, scope)
+        bucket=self.signatures.setdefault(sig, [])
+        bucket.append(entry_id)
+        # Keep buckets short, then evict least recently used entries
+        if len(bucket) > self.bucket_size:
+            self._remove(bucket[0])
+        while len(self.entries) > self.maxsize:
+            self._remove(next(iter(self.entries)))
+
+    def clear(self):
+        '''Drop all cached answers (e.g. after new documents are ingested).'''
+        self.entries.clear()
+        self.signatures.clear()
+
+    def state(self):
+        '''Snapshot the projection planes and unexpired entries for write_state().'''
+        now=time.time()
+        entries=[(answer, vec, created_at, scope) for answer, vec, created_at, _, scope in self.entries.values()
+                 if now - created_at <= self.ttl]
+        return {"version": 3, "planes": self.planes, "entries": entries}
+
+    @staticmethod
+    def write_state(path, state):
+        '''Write a snapshot from state() to disk (safe to run off the thread using the cache).'''
+        # Write to a temporary file and swap it in, since several server workers may save at once
+        tmp_path=f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(state['entries'])} semantic cache entries to {path}")
+
+    @staticmethod
+    def read_state(path):
+        '''Read a snapshot written by write_state(); returns None if there is none (safe to run off-thread).'''
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def restore(self, state, since=None):
+        '''
+        Merge a snapshot from read_state() into the cache; returns False if it is missing or incompatible.
+        Entries created before `since` (epoch seconds) or already expired are skipped.
+        '''
+        if state is None:
+            return False
+        # Signatures are only valid with the planes they were computed with
+        if state.get("version") != 3 or state["planes"].shape != self.planes.shape:
+            self.logger.warning("Ignoring saved semantic cache: incompatible format")
+            return False
+        # Re-bucket entries added since startup under the restored planes, keeping them most recent
+        current=[(answer, vec, created_at, scope) for answer, vec, created_at, _, scope in self.entries.values()]
+        self.planes=state["planes"]
+        self.clear()
+        cutoff=max(time.time() - self.ttl, since or 0)
+        for answer, vec, created_at, scope in state["entries"]:
+            if created_at >= cutoff:
+                self._insert(answer, vec, created_at, self._bits(vec).tobytes(), scope)
+        for answer, vec, created_at, scope in current:
+            self._insert(answer, vec, created_at, self._bits(vec).tobytes(), scope)
+        self.logger.info(f"Loaded {len(self.entries)} semantic cache entries")
+        return True
+
+    def save(self, path):
+        '''Persist the projection planes and unexpired entries to disk.'''
+        self.write_state(path, self.state())
+
+    def load(self, path, since=None):
+        '''Restore entries saved with save(); returns False if there is nothing to load.'''
+        return self.restore(self.read_state(path), since)
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,18 +1,44 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 from pathlib import Path
 import logging
 import re
-import json
+import orjson
 
 # Initialize logger for this module
 logger=logging.getLogger(__name__)
 
+# Page markers ("# Page N") inserted by DocumentProcessor
+_PAGE_RE=re.compile(r'^[ \t]*#[ \t]*Page[ \t]*(\d+)', re.M)
+# Level 2 headers (##) used as section boundaries
+_HEADER_RE=re.compile(r'^[ \t]*##[ \t]+(.*)$', re.M)
+# Code fence lines (``` or ~~~); markers inside fenced blocks are ignored
+_FENCE_RE=re.compile(r'^[ \t]*(```|~~~).*$', re.M)
+
+def _fence_spans(text):
+    '''Return (start, end) offsets of fenced code blocks, as MarkdownHeaderTextSplitter detects them.'''
+    spans=[]
+    fence, fence_start="", None
+    for match in _FENCE_RE.finditer(text):
+        line=match.group(0).strip()
+        if not fence:
+            # An opening ``` must not also close on the same line
+            if match.group(1) == "~~~" or line.count("```") == 1:
+                fence, fence_start=match.group(1), match.start()
+        elif match.group(1) == fence:
+            spans.append((fence_start, match.end()))
+            fence=""
+    if fence:
+        spans.append((fence_start, len(text)))
+    return spans
+
 class DocumentChunking:
     '''
     Document chunking class for intelligent text splitting strategies.
 
     1. Header-based splitting: Splits documents by markdown headers (##)
     2. Character-based splitting: Further splits header sections into smaller chunks
+       (done in the same pass as header splitting)
     '''
     def __init__(self, output_folder):
         # Define output directories for different split types
@@ -23,57 +49,111 @@ class DocumentChunking:
         self.header_splits_folder.mkdir(parents=True, exist_ok=True)
         self.char_splits_folder.mkdir(parents=True, exist_ok=True)
 
-    def doc_header_split(self, md_path):
+    @staticmethod
+    def _clean_section(text):
+        # Strip lines and drop blank ones (kept inside code blocks);
+        # paragraphs are joined with markdown line breaks
+        paragraphs, lines, fence=[], [], ""
+        for line in text.split("\n"):
+            stripped=line.strip()
+            if not fence:
+                if stripped.startswith("```") and stripped.count("```") == 1:
+                    fence="```"
+                elif stripped.startswith("~~~"):
+                    fence="~~~"
+            elif stripped.startswith(fence):
+                fence=""
+            if fence or stripped:
+                lines.append(stripped)
+            elif lines:
+                paragraphs.append("\n".join(lines))
+                lines=[]
+        if lines:
+            paragraphs.append("\n".join(lines))
+        return "  \n".join(paragraphs)
+
+    def _iter_header_sections(self, md_path):
         '''
-        Split markdown document by headers to create semantic sections.
+        Yield (text, metadata) for each header section of the markdown document.
+
+        Single pass over the header (##) and page (# Page N) markers: each
+        section is tagged with its header and the first page marker inside it,
+        or the page it continues from.
         '''
-        self.logger.info(f"Creating splits based on headings for: {md_path}")
         # Load the markdown document
         with open(md_path, 'r', encoding='utf-8') as f:
             markdown_document=f.read()
 
-        # Define header hierarchy for splitting
-        # Currently splitting on ## headers (level 2 headers)
-        headers_to_split_on = [
-            ("##", "Header 1"),
-        ]
-
-        # Initialize markdown header splitter
-        # strip_headers=False preserves header
-        markdown_splitter = MarkdownHeaderTextSplitter(
-            headers_to_split_on=headers_to_split_on, strip_headers=False
+        fences=_fence_spans(markdown_document)
+        markers=sorted(
+            (match for match in [*_HEADER_RE.finditer(markdown_document), *_PAGE_RE.finditer(markdown_document)]
+             if not any(start <= match.start() < end for start, end in fences)),
+            key=lambda match: match.start()
         )
-        # Perform header-based splitting
-        md_header_splits = markdown_splitter.split_text(markdown_document)
+
+        header=None        # Current section header
+        page=None          # Last page marker seen
+        section_page=None  # First page marker inside the current section
+        section_start=0
+        carry=""           # Header-less preamble merged into the next section
+
+        # A trailing None closes the last section at the end of the document
+        for match in [*markers, None]:
+            if match is not None and match.re is _PAGE_RE:
+                page=f"Page {match.group(1)}"
+                if section_page is None:
+                    section_page=page
+                continue
+
+            end=match.start() if match is not None else len(markdown_document)
+            body=self._clean_section(markdown_document[section_start:end])
+            if carry:
+                body=f"{carry}  \n{body}" if body else carry
+                carry=""
+            if body:
+                # Keep a preamble ending in a markdown heading (e.g. "# Page 1")
+                # together with the section that follows it
+                if header is None and match is not None and body.rsplit("\n", 1)[-1].startswith("#"):
+                    carry=body
+                else:
+                    metadata={"Header 1": header} if header is not None else {}
+                    metadata["Page"]=section_page or page
+                    yield body, metadata
+                    section_page=None
+
+            if match is not None:
+                header=match.group(1).strip()
+                section_start=match.start()
+
+    def doc_header_split(self, md_path):
+        '''
+        Split markdown document by headers to create semantic sections.
+        '''
+        self.logger.info(f"Creating splits based on headings for: {md_path}")
+        md_header_splits=[
+            Document(page_content=body, metadata=metadata)
+            for body, metadata in self._iter_header_sections(md_path)
+        ]
         self.logger.info(f"Completed header split: {len(md_header_splits)} chunks created.")
         return md_header_splits
 
-    def doc_chunk_splits(self, header_splits, chunk_size=1000, chunk_overlap=100):
+    def doc_chunk_splits(self, md_path, chunk_size=1000, chunk_overlap=100):
+        '''
+        Split markdown document by headers, then each section by characters, in one pass.
+        '''
         self.logger.info(f"Starting chunk splits with chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
         
-        # Page number detection and metadata enhancement
-        # This preserves page information across chunks for better source attribution
-        page_name = None
-        for doc in header_splits:
-            # Look inside the text content for a page header
-            match = re.search(r'#\s*Page\s*(\d+)', doc.page_content)
-
-            if match:
-                # If found, update current page name
-                page_name = f"Page {match.group(1)}"
-                doc.metadata["Page"] = page_name
-            else:
-                # Otherwise, inherit from previous document
-                doc.metadata["Page"] = page_name
-        
         # Initialize recursive character text splitter
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
-        # header_splits is list of Document objects
-        # Apply character-based splitting to header-split documents
-        chunked_docs = text_splitter.split_documents(header_splits)
+        # Apply character-based splitting to each header section as it is produced
+        chunked_docs=[
+            Document(page_content=piece, metadata=dict(metadata))
+            for body, metadata in self._iter_header_sections(md_path)
+            for piece in text_splitter.split_text(body)
+        ]
         self.logger.info(f"Completed chunk splitting: {len(chunked_docs)} chunks created.")
         return chunked_docs
 
@@ -82,17 +162,16 @@ class DocumentChunking:
         Save document chunks to JSONL format for persistence and analysis.
         '''
         save_path = folder_path / filename
-        # Write documents to JSON format
-        with open(save_path, "w", encoding="utf-8") as f:
-            for doc in documents:
-                # Only include fields that have values
-                data = {
-                    "page_content": doc.page_content,  # The actual text content
-                    "metadata": doc.metadata
-                }
-                if getattr(doc, "id", None):  # only add ID if exists and not None
-                    data["id"] = doc.id
-                # Write each document as a separate JSON line
-                f.write(json.dumps(data) + "\n")
+        # Serialize every document with orjson, then write the file in one call
+        lines = []
+        for doc in documents:
+            data = {
+                "page_content": doc.page_content,  # The actual text content
+                "metadata": doc.metadata
+            }
+            if getattr(doc, "id", None):  # only add ID if exists and not None
+                data["id"] = doc.id
+            lines.append(orjson.dumps(data))
+        save_path.write_bytes(b"\n".join(lines) + b"\n" if lines else b"")
         self.logger.info(f"Successfully saved documents to {save_path}")
-        return save_path
\ No newline at end of file
+        return save_path
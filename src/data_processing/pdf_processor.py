@@ -1,4 +1,5 @@
 from docling.document_converter import DocumentConverter
+from docling.datamodel.base_models import InputFormat
 from pathlib import Path
 import sys
 import logging
@@ -6,6 +7,19 @@ import logging
 # Initialize logging for this module
 logger=logging.getLogger(__name__)
 
+# One Docling converter per process, reused across conversions
+_converter=None
+
+def get_converter():
+    global _converter
+    if _converter is None:
+        _converter=DocumentConverter()
+    return _converter
+
+def warm_up_converter():
+    """Create the process-wide converter and load its PDF pipeline models ahead of the first conversion."""
+    get_converter().initialize_pipeline(InputFormat.PDF)
+
 class DocumentProcessor:
     def __init__(self, output_folder):
         # Folder Configurations
@@ -18,7 +32,7 @@ class DocumentProcessor:
         """Convert PDF to markdown using Docling and return the Markdown file path (in markdown/ subfolder)."""
         try:
             self.logger.info(f"Starting Docling conversion for: {pdf_path}")
-            converter=DocumentConverter()
+            converter=get_converter()
             result=converter.convert(str(pdf_path))
 
             # Enhanced markdown export with page breaks and formatting options
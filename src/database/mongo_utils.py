@@ -1,4 +1,5 @@
 from pathlib import Path
+from hashlib import blake2b
 from dotenv import load_dotenv
 import os
 import logging
@@ -6,6 +7,7 @@ import pymongo
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from pymongo.operations import SearchIndexModel
+from bson.binary import Binary, BinaryVectorDtype
 
 # Initialize Logging
 logger = logging.getLogger(__name__)
@@ -23,6 +25,8 @@ INDEX_NAME = os.getenv("MONGO_VECTOR_INDEX")
 client = MongoClient(uri, server_api=ServerApi('1'))
 db     = client[DB_NAME]
 coll   = db[COLLECTION_NAME]
+# Chunk embeddings keyed by sha256 of the chunk text (indexed on _id)
+embedding_cache_coll = db["embedding_cache"]
 
 # Send a ping to confirm a successful connection
 try:
@@ -31,6 +35,13 @@ try:
 except Exception as e:
     print(e)
 
+def to_bson_vector(vector):
+    """Pack an embedding as a float32 BSON vector (half the size of an array of doubles)."""
+    return Binary.from_vector(vector, BinaryVectorDtype.FLOAT32)
+
+# Set once the vector search index is known to exist
+_vector_index_checked=False
+
 # Create vector search index
 def create_vector_index():
     """Create MongoDB Atlas vector search index for semantic search."""
@@ -39,10 +50,13 @@ def create_vector_index():
             "fields": [
                 # ---------- VECTOR ----------
                 {
+                    # Embeddings are stored as float32 BSON vectors (binData)
                     "type": "vector",
                     "path": "embedding",          
                     "numDimensions": 768,         
-                    "similarity": "cosine"
+                    "similarity": "cosine",
+                    # Atlas-side int8 scalar quantization of the index (full vectors kept for storage)
+                    "quantization": "scalar"
                 },
 
                 # ---------- METADATA FILTERS ----------
@@ -63,81 +77,132 @@ def create_vector_index():
         name=INDEX_NAME,
         type="vectorSearch"
     )
+    global _vector_index_checked
+    # Only list search indexes once per process
+    if _vector_index_checked:
+        return
     # Check if index already exists
-    existing_indexes=[idx["name"] for idx in coll.list_search_indexes()]
+    existing_indexes=[idx["name"] for idx in coll.list_search_indexes(INDEX_NAME)]
     if INDEX_NAME not in existing_indexes:
         logger.info(f"Creating vector index '{INDEX_NAME}'...")
         coll.create_search_indexes([vector_index])
     else:
         logger.info(f"Vector index '{INDEX_NAME}' already exists.")
+    _vector_index_checked=True
+
+# Set once the metadata.source index (used to replace a PDF's chunks) exists
+_source_index_created=False
 
 # Adding Data to MongoDB
 def upsert_data(chunks, vectors, pdf_path):
-    """Store document chunks with embeddings in MongoDB using upsert operation."""
+    """Store document chunks with embeddings in MongoDB, replacing any chunks stored for the same PDF."""
     # Ensure pdf_path is a Path object
     if isinstance(pdf_path, str):
         pdf_path = Path(pdf_path)
     docs_to_insert=[]
     for chunk, vector in zip(chunks, vectors):
+        # Deterministic chunk id (stable across processes, unlike hash())
+        content_hash=blake2b(chunk.page_content.encode('utf-8'), digest_size=16).hexdigest()
         doc={
+            "_id": f"{pdf_path.name}_{content_hash}",
             "text": chunk.page_content,
-            "embedding": vector,
+            "embedding": to_bson_vector(vector),
             "metadata":{
                 "source":pdf_path.name,
                 "page": chunk.metadata.get("Page", None),
                 "header": chunk.metadata.get("Header 1", None),
-                "chunk_id":f"{pdf_path.stem}_{hash(chunk.page_content)}"
             }
         }
         docs_to_insert.append(doc)
 
-    # Bulk upsert operation (insert new or update existing)
+    # Write the new chunks before removing old ones so a failed upload leaves the
+    # previous version searchable; replacing by _id also refreshes page/header metadata
     if docs_to_insert:
-        result=coll.bulk_write([
-            pymongo.ReplaceOne(
-                {"metadata.chunk_id":doc["metadata"]["chunk_id"]},
-                doc,
-                upsert=True
-            ) for doc in docs_to_insert
-        ])
-        logger.info(f"Upserted {result.upserted_count + result.modified_count} chunks.")
+        result=coll.bulk_write(
+            [pymongo.ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs_to_insert],
+            ordered=False,
+            bypass_document_validation=True,
+        )
+        logger.info(f"Stored {len(docs_to_insert)} chunks ({result.upserted_count} new, {result.matched_count} replaced).")
     else:
         logger.info("No chunks to upsert.")
 
-def search_result_for_llm(query, top_k, embeddings):
+    # Drop chunks from older versions of this PDF (including pre-_id ObjectId documents)
+    global _source_index_created
+    if not _source_index_created:
+        coll.create_index("metadata.source")
+        _source_index_created=True
+    new_ids=[doc["_id"] for doc in docs_to_insert]
+    deleted=coll.delete_many({"metadata.source": pdf_path.name, "_id": {"$nin": new_ids}}).deleted_count
+    if deleted:
+        logger.info(f"Removed {deleted} stale chunks for {pdf_path.name}.")
+
+def get_cached_embeddings(hashes):
+    """Fetch cached chunk embeddings for the given content hashes."""
+    if not hashes:
+        return {}
+    cursor=embedding_cache_coll.find({"_id": {"$in": list(hashes)}})
+    # Entries written before the switch to BSON vectors are plain lists
+    return {
+        doc["_id"]: doc["embedding"].as_vector().data if isinstance(doc["embedding"], Binary) else doc["embedding"]
+        for doc in cursor
+    }
+
+def save_cached_embeddings(hash_to_vector):
+    """Store chunk embeddings keyed by content hash."""
+    if not hash_to_vector:
+        return
+    result=embedding_cache_coll.bulk_write([
+        pymongo.ReplaceOne({"_id": h}, {"_id": h, "embedding": to_bson_vector(vector)}, upsert=True)
+        for h, vector in hash_to_vector.items()
+    ], ordered=False)
+    logger.info(f"Cached {result.upserted_count + result.modified_count} chunk embeddings.")
+
+def search_result_for_llm(query, top_k, embeddings, filter_source=None):
     """Perform vector search and return formatted context for LLM."""
     # Convert query to embedding vector
     query_emb=embeddings.embed_query(query)
+    return search_result_for_llm_with_vec(query_emb=query_emb, top_k=top_k, filter_source=filter_source)
+
+def search_result_for_llm_with_vec(query_emb, top_k, filter_source=None):
+    """
+    Perform vector search with a precomputed query embedding and return formatted context for LLM.
+    If filter_source is given, only chunks from that PDF filename are searched.
+    """
+    vector_search={
+        "index": INDEX_NAME,
+        "path": "embedding",
+        "queryVector": to_bson_vector(query_emb),
+        # Search more candidates for better results, bounded for large top_k
+        "numCandidates": max(min(max(top_k * 10, 50), 500), top_k),
+        "limit": top_k
+    }
+    if filter_source is not None:
+        # Pre-filter on the indexed metadata.source field
+        vector_search["filter"]={"metadata.source": {"$eq": filter_source}}
     # MongoDB aggregation pipeline for vector search
     pipeline=[
         {
-            "$vectorSearch":{
-                "index": INDEX_NAME,
-                "path": "embedding",
-                "queryVector": query_emb,
-                "numCandidates": top_k * 20, # Search more candidates for better results
-                "limit": top_k
-            }
+            "$vectorSearch": vector_search
         },
         {
             "$project":
             {
+                # Only the fields used for the LLM context (no score) to keep results small
                 "text":1,
-                "metadata":1,
+                "metadata.source":1,
+                "metadata.header":1,
+                "metadata.page":1,
                 "_id":0,
-                "score": { "$meta": "vectorSearchScore" }, # Include similarity score
-
             }
         }
     ]
     # Execute search and format results
     results=coll.aggregate(pipeline)
-    context=[]
-    for i, result in enumerate(results, 1):
-        page=result['metadata'].get("page", "Unknown")
-        text=result['text'].strip()
-        source = result['metadata'].get("source", "Unknown")
-        header = result['metadata'].get("header", "Unknown")
-        context.append(f"[{i}] {source} | {header} | {page}:{text} ")
-    logger.info(f"Search result for LLM:\n" + "\n\n".join(context))
-    return "\n\n".join(context)
\ No newline at end of file
+    context="\n\n".join(
+        f"[{i}] {result['metadata'].get('source', 'Unknown')} | {result['metadata'].get('header', 'Unknown')} | "
+        f"{result['metadata'].get('page', 'Unknown')}:{result['text'].strip()} "
+        for i, result in enumerate(results, 1)
+    )
+    logger.debug("Search result for LLM:\n%s", context)
+    return context
\ No newline at end of file
@@ -36,17 +36,24 @@ def get_prompt_template(prompt_path):
     prompt = ChatPromptTemplate.from_template(template=template)
     return prompt
 
-def get_answer(query, llm, prompt, content):
+def get_chain(llm, prompt):
     '''
-    Generate answer using RAG pipeline with retrieved context.
+    Build the RAG chain once so it can be reused across requests.
     '''
     # Create processing chain: prompt -> LLM -> string output
     chain = prompt | llm | StrOutputParser()
-    
+    return chain
+
+def get_answer(query, chain, content, source=None):
+    '''
+    Generate answer using RAG pipeline with retrieved context.
+    source is the PDF filename the search was restricted to (logged only).
+    '''
     # Invoke chain with user query and retrieved context
     response=chain.invoke({
                     'query':query,
                     'context':content
                         })
-    logger.info(f"The response for the query: {query} is: \n\n {response}")
+    scope=f" [source: {source}]" if source else ""
+    logger.info(f"The response for the query: {query}{scope} is: \n\n {response}")
     return response
\ No newline at end of file